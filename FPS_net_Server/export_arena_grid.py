@@ -0,0 +1,135 @@
+"""
+离线导出竞技场静态碰撞占用栅格（供server142.py命中检测做墙体遮挡）
+
+用法：
+1. UE编辑器内（Python脚本插件）打开Lvl_ArenaShooter后执行：
+   py "FPS_net_Server/export_arena_grid.py" --from-editor -o FPS_net_Server/arena_collision.grid
+   → 采集关卡中所有StaticMeshActor的碰撞包围盒
+2. 普通Python环境，从JSON包围盒列表导出：
+   python export_arena_grid.py arena_boxes.json -o arena_collision.grid --cell-size 25
+   JSON格式：[[x_min, y_min, x_max, y_max], ...] 或 {"boxes": [...]}
+
+文件格式（小端）：头部 <4sHHfffII>（魔数FPSG、版本、保留、格子边长、原点x、原点y、宽、高）
+之后为 宽×高 字节的占用表（按行存储，1=墙体，0=可通行），须与server142.py的读取逻辑保持一致
+"""
+import argparse
+import json
+import math
+import struct
+import sys
+
+ARENA_GRID_MAGIC = b"FPSG"
+ARENA_GRID_VERSION = 1
+ARENA_GRID_HEADER = struct.Struct("<4sHHfffII")
+
+DEFAULT_CELL_SIZE = 25.0  # 格子边长（游戏单位）
+# 只有与玩家高度区间重叠的几何体才会遮挡射线（玩家中心z=90，碰撞半径50）
+DEFAULT_Z_RANGE = (40.0, 140.0)
+MAX_GRID_CELLS = 16 * 1024 * 1024  # 栅格上限（防止误传超大范围导致文件过大）
+
+
+def load_boxes_from_json(path):
+    """读取JSON包围盒列表"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("boxes", [])
+    boxes = []
+    for item in data:
+        if isinstance(item, dict):
+            x_min, y_min = item["min"][:2]
+            x_max, y_max = item["max"][:2]
+        else:
+            x_min, y_min, x_max, y_max = item[:4]
+        boxes.append((float(min(x_min, x_max)), float(min(y_min, y_max)),
+                      float(max(x_min, x_max)), float(max(y_min, y_max))))
+    return boxes
+
+
+def load_boxes_from_editor(z_range):
+    """在UE编辑器内采集当前关卡StaticMeshActor的碰撞包围盒（仅保留与玩家高度重叠的部分）"""
+    import unreal
+
+    actor_subsystem = unreal.get_editor_subsystem(unreal.EditorActorSubsystem)
+    boxes = []
+    for actor in actor_subsystem.get_all_level_actors():
+        if not isinstance(actor, unreal.StaticMeshActor):
+            continue
+        origin, extent = actor.get_actor_bounds(True)
+        if extent.x <= 0 or extent.y <= 0:
+            continue
+        if origin.z + extent.z < z_range[0] or origin.z - extent.z > z_range[1]:
+            continue
+        boxes.append((origin.x - extent.x, origin.y - extent.y,
+                      origin.x + extent.x, origin.y + extent.y))
+    return boxes
+
+
+def rasterize_boxes(boxes, cell_size, origin=None, size=None):
+    """将包围盒栅格化为占用表（保守覆盖：与包围盒有重叠的格子均标记为墙体）"""
+    if origin is None or size is None:
+        if not boxes:
+            raise ValueError("没有可导出的包围盒，请指定--origin/--size")
+        bound_min_x = min(b[0] for b in boxes)
+        bound_min_y = min(b[1] for b in boxes)
+        bound_max_x = max(b[2] for b in boxes)
+        bound_max_y = max(b[3] for b in boxes)
+        origin = origin or (bound_min_x, bound_min_y)
+        size = size or (bound_max_x - origin[0], bound_max_y - origin[1])
+
+    width = max(1, int(math.ceil(size[0] / cell_size)))
+    height = max(1, int(math.ceil(size[1] / cell_size)))
+    if width * height > MAX_GRID_CELLS:
+        raise ValueError(f"栅格过大（{width}×{height}），请增大--cell-size")
+
+    cells = bytearray(width * height)
+    for x_min, y_min, x_max, y_max in boxes:
+        cx0 = max(0, int(math.floor((x_min - origin[0]) / cell_size)))
+        cy0 = max(0, int(math.floor((y_min - origin[1]) / cell_size)))
+        cx1 = min(width - 1, int(math.floor((x_max - origin[0]) / cell_size)))
+        cy1 = min(height - 1, int(math.floor((y_max - origin[1]) / cell_size)))
+        if cx1 < cx0 or cy1 < cy0:  # 包围盒完全在栅格范围外
+            continue
+        filled_row = b"\x01" * (cx1 - cx0 + 1)
+        for cy in range(cy0, cy1 + 1):
+            row = cy * width
+            cells[row + cx0:row + cx1 + 1] = filled_row
+    return origin, width, height, cells
+
+
+def write_grid(path, cell_size, origin, width, height, cells):
+    """写出栅格文件"""
+    with open(path, "wb") as f:
+        f.write(ARENA_GRID_HEADER.pack(ARENA_GRID_MAGIC, ARENA_GRID_VERSION, 0,
+                                       cell_size, origin[0], origin[1], width, height))
+        f.write(cells)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="导出竞技场静态碰撞占用栅格")
+    parser.add_argument("boxes_json", nargs="?", help="包围盒JSON文件（--from-editor时不需要）")
+    parser.add_argument("-o", "--output", default="arena_collision.grid", help="输出栅格文件路径")
+    parser.add_argument("--from-editor", action="store_true", help="在UE编辑器内从当前关卡采集")
+    parser.add_argument("--cell-size", type=float, default=DEFAULT_CELL_SIZE, help="格子边长（游戏单位）")
+    parser.add_argument("--z-range", type=float, nargs=2, default=DEFAULT_Z_RANGE, help="遮挡高度区间")
+    parser.add_argument("--origin", type=float, nargs=2, help="栅格原点x y（默认取包围盒最小值）")
+    parser.add_argument("--size", type=float, nargs=2, help="栅格覆盖范围宽 高（默认取包围盒范围）")
+    args = parser.parse_args(argv)
+
+    if args.from_editor:
+        boxes = load_boxes_from_editor(args.z_range)
+    elif args.boxes_json:
+        boxes = load_boxes_from_json(args.boxes_json)
+    else:
+        parser.error("需要提供包围盒JSON文件或使用--from-editor")
+
+    origin, width, height, cells = rasterize_boxes(boxes, args.cell_size, args.origin, args.size)
+    write_grid(args.output, args.cell_size, origin, width, height, cells)
+    occupied = sum(1 for c in cells if c)
+    print(f"导出完成：{args.output}，{len(boxes)}个包围盒 → {width}×{height}栅格"
+          f"（格子{args.cell_size}单位，原点({origin[0]:.1f},{origin[1]:.1f})，墙体格子{occupied}个）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,604 @@
+"""
+本地网络劣化代理：架在游戏服务器8888端口前，按连接注入延迟、抖动、带宽限制、卡顿和连接重置
+用于在本机复现弱网，验证服务器发送路径、死连接清理和开火逻辑的表现
+
+用法：
+    # 仅代理：客户端改连9888
+    python net_impair_proxy.py --delay 80 --jitter 30 --bandwidth 256 --stall-prob 0.02 --stall 1500 --reset-prob 0.001
+    # 可选UDP代理（按报文注入延迟/抖动/丢包）：server142.py目前没有UDP端口（8889是TCP观战广播流），
+    # <UDP端口>填将来的UDP游戏端口或其他UDP服务
+    python net_impair_proxy.py --udp-listen 9889 --udp-target 127.0.0.1:<UDP端口> --loss 0.05
+    # 浸泡测试：自动启动server142.py + 劣化代理 + 脚本客户端，定期报告帧稳定性、发送积压和服务器内存
+    python net_impair_proxy.py --soak --clients 8 --duration 7200 --delay 100 --jitter 40 --report-csv soak.csv
+"""
+import argparse
+import collections
+import csv
+import heapq
+import os
+import random
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+try:
+    import psutil  # 可选：跨平台读取服务器内存；未安装时在Linux下读/proc
+except ImportError:
+    psutil = None
+
+# ===================== 全局配置 =====================
+PROXY_LISTEN_HOST = "0.0.0.0"
+PROXY_LISTEN_PORT = 9888
+TARGET_HOST = "127.0.0.1"
+TARGET_PORT = 8888  # server142.py监听端口
+RECV_CHUNK_SIZE = 65536
+MAX_QUEUED_BYTES = 16 * 1024  # 单向管道默认积压上限（字节），超出后停止读取，把卡顿/限速反压回发送端socket
+IMPAIR_TICK_INTERVAL = 1.0  # 卡顿/重置随机判定间隔（秒）
+
+# 浸泡测试配置
+SOAK_REPORT_INTERVAL = 10.0  # 报告间隔（秒）
+SOAK_EXPECTED_TICK_RATE = 20.0  # 服务器预期帧率（与server142.py的GAME_TICK_INTERVAL对应）
+SOAK_CMD_INTERVAL = (0.05, 0.5)  # 脚本客户端发送命令的随机间隔（秒）
+SOAK_RECONNECT_DELAY = 1.0  # 脚本客户端断线后的重连间隔（秒）
+SOAK_COMMANDS = [b"k|1", b"k|m", b"k|2", b"k|n", b"k|3", b"k|p", b"k|4", b"k|q",
+                 b"m|l", b"m|r", b"m|s", b"k|f", b"k|nf"]
+
+# 劣化参数（由命令行覆盖）
+impair_config = {
+    "delay": 0.0,  # 单向固定延迟（秒）
+    "jitter": 0.0,  # 抖动幅度（秒，均匀分布±jitter）
+    "bandwidth": 0.0,  # 单向带宽上限（字节/秒，0=不限）
+    "stall_prob": 0.0,  # 每连接每秒进入卡顿的概率
+    "stall": 0.0,  # 卡顿时长（秒）
+    "reset_prob": 0.0,  # 每连接每秒被重置（RST）的概率
+    "loss": 0.0,  # UDP丢包率
+    "max_queued_bytes": MAX_QUEUED_BYTES,  # 单向管道积压上限（字节）
+}
+
+proxy_running = True
+proxy_conns = []  # 活跃的代理连接
+proxy_conns_lock = threading.Lock()
+proxy_stats = {"accepted": 0, "closed": 0, "resets": 0, "stalls": 0, "server_disconnects": 0}
+
+
+# ===================== 工具函数 =====================
+def log(msg):
+    """普通日志"""
+    now = datetime.now().strftime("[%H:%M:%S]")
+    print(f"{now} 📢 {msg}")
+
+
+def log_error(msg):
+    """错误日志"""
+    now = datetime.now().strftime("[%H:%M:%S]")
+    print(f"{now} ❌ {msg}")
+
+
+def parse_host_port(value, default_port):
+    """解析 host:port"""
+    host, _, port = value.rpartition(":")
+    if not host:
+        return value, default_port
+    return host, int(port)
+
+
+def percentile(values, ratio):
+    """计算分位数（values需已排序）"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * ratio))]
+
+
+# ===================== TCP劣化代理 =====================
+def new_pipe():
+    """单向管道状态：按到期时间排队的数据块（TCP保序：到期时间单调不减）"""
+    return {
+        "queue": collections.deque(),  # (到期时间, 数据)
+        "cond": threading.Condition(),
+        "queued_bytes": 0,
+        "last_due": 0.0,
+        "bandwidth_next": 0.0,  # 带宽限制下一块可发送时间
+    }
+
+
+def close_conn(conn, reset=False):
+    """关闭代理连接；reset=True时以RST方式关闭两端（SO_LINGER=0）"""
+    with proxy_conns_lock:
+        if conn["closed"]:
+            return
+        conn["closed"] = True
+        if conn in proxy_conns:
+            proxy_conns.remove(conn)
+        proxy_stats["closed"] += 1
+    for sock in (conn["client"], conn["server"]):
+        try:
+            if reset:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            sock.close()
+        except OSError:
+            pass
+    for pipe in (conn["up"], conn["down"]):
+        with pipe["cond"]:
+            pipe["cond"].notify_all()
+
+
+def pipe_reader(conn, pipe, src):
+    """
+    读取一端数据，计算到期时间后入队
+    积压超过max_queued_bytes时停止读取，等待写线程发出数据：卡顿/限速经内核缓冲区反压到发送端，
+    服务器一侧表现为发送缓冲区写满（与真实弱网一致），而不是无限堆积在代理内
+    """
+    while not conn["closed"]:
+        with pipe["cond"]:
+            while pipe["queued_bytes"] >= impair_config["max_queued_bytes"] and not conn["closed"]:
+                pipe["cond"].wait(0.5)
+            room = impair_config["max_queued_bytes"] - pipe["queued_bytes"]
+        if conn["closed"]:
+            return
+        try:
+            data = src.recv(min(RECV_CHUNK_SIZE, room))
+        except socket.timeout:
+            continue
+        except OSError:
+            data = b""
+        if not data:
+            # 服务器一侧先断开（死连接清理/发送失败），单独计数
+            if src is conn["server"] and not conn["closed"]:
+                with proxy_conns_lock:
+                    proxy_stats["server_disconnects"] += 1
+                log(f"🔻 服务器断开代理连接：客户端[{conn['addr']}]")
+            close_conn(conn)
+            return
+        now = time.monotonic()
+        due = now + impair_config["delay"] + random.uniform(-impair_config["jitter"], impair_config["jitter"])
+        with pipe["cond"]:
+            due = max(due, pipe["last_due"], now)
+            pipe["last_due"] = due
+            pipe["queue"].append((due, data))
+            pipe["queued_bytes"] += len(data)
+            pipe["cond"].notify()
+
+
+def pipe_writer(conn, pipe, dst):
+    """按到期时间、卡顿状态和带宽上限把数据写到另一端"""
+    while True:
+        with pipe["cond"]:
+            while not pipe["queue"] and not conn["closed"]:
+                pipe["cond"].wait(0.5)
+            if conn["closed"]:
+                return
+            due, data = pipe["queue"][0]
+
+        # 等待到期、卡顿结束、带宽令牌
+        while not conn["closed"]:
+            now = time.monotonic()
+            ready_time = max(due, conn["stall_until"], pipe["bandwidth_next"])
+            if now >= ready_time:
+                break
+            time.sleep(min(ready_time - now, 0.05))
+        if conn["closed"]:
+            return
+
+        bandwidth = impair_config["bandwidth"]
+        if bandwidth > 0:
+            pipe["bandwidth_next"] = max(pipe["bandwidth_next"], time.monotonic()) + len(data) / bandwidth
+        # socket带0.5秒超时（供读线程检查关闭标记），对端接收慢时超时后继续发送剩余部分
+        remaining = memoryview(data)
+        while remaining and not conn["closed"]:
+            try:
+                remaining = remaining[dst.send(remaining):]
+            except socket.timeout:
+                continue
+            except OSError:
+                close_conn(conn)
+                return
+        with pipe["cond"]:
+            pipe["queue"].popleft()
+            pipe["queued_bytes"] -= len(data)
+            pipe["cond"].notify_all()  # 唤醒因积压超限而暂停的读线程
+
+
+def handle_proxy_client(client_sock, client_addr, target):
+    """为一个客户端建立到服务器的连接，并启动上下行两条劣化管道"""
+    try:
+        server_sock = socket.create_connection(target, timeout=3.0)
+    except OSError as e:
+        log_error(f"代理连接服务器{target[0]}:{target[1]}失败：{str(e)}")
+        client_sock.close()
+        return
+    for sock in (client_sock, server_sock):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(0.5)
+
+    conn = {
+        "addr": f"{client_addr[0]}:{client_addr[1]}",
+        "client": client_sock,
+        "server": server_sock,
+        "up": new_pipe(),  # 客户端 → 服务器
+        "down": new_pipe(),  # 服务器 → 客户端
+        "stall_until": 0.0,
+        "closed": False,
+    }
+    with proxy_conns_lock:
+        proxy_conns.append(conn)
+        proxy_stats["accepted"] += 1
+    threading.Thread(target=pipe_reader, args=(conn, conn["up"], client_sock), daemon=True).start()
+    threading.Thread(target=pipe_writer, args=(conn, conn["up"], server_sock), daemon=True).start()
+    threading.Thread(target=pipe_reader, args=(conn, conn["down"], server_sock), daemon=True).start()
+    threading.Thread(target=pipe_writer, args=(conn, conn["down"], client_sock), daemon=True).start()
+    log(f"代理连接建立：客户端[{conn['addr']}] → 服务器{target[0]}:{target[1]}")
+
+
+def impair_tick_loop():
+    """每秒对每个连接随机注入卡顿/重置"""
+    while proxy_running:
+        time.sleep(IMPAIR_TICK_INTERVAL)
+        with proxy_conns_lock:
+            conns = list(proxy_conns)
+        now = time.monotonic()
+        for conn in conns:
+            if impair_config["reset_prob"] > 0 and random.random() < impair_config["reset_prob"]:
+                log(f"⚡ 注入连接重置：客户端[{conn['addr']}]")
+                proxy_stats["resets"] += 1
+                close_conn(conn, reset=True)
+                continue
+            if (impair_config["stall_prob"] > 0 and conn["stall_until"] <= now
+                    and random.random() < impair_config["stall_prob"]):
+                conn["stall_until"] = now + impair_config["stall"]
+                proxy_stats["stalls"] += 1
+                log(f"⏸️ 注入卡顿{impair_config['stall']:.2f}秒：客户端[{conn['addr']}]")
+
+
+def proxy_accept_loop(listen_sock, target):
+    """接受客户端连接"""
+    while proxy_running:
+        try:
+            client_sock, client_addr = listen_sock.accept()
+        except socket.timeout:
+            continue
+        except OSError as e:
+            if proxy_running:
+                log_error(f"代理接受连接异常：{str(e)}")
+            return
+        threading.Thread(target=handle_proxy_client, args=(client_sock, client_addr, target),
+                         daemon=True, name=f"ProxyConn_{client_addr[0]}:{client_addr[1]}").start()
+
+
+def start_tcp_proxy(listen_host, listen_port, target):
+    """启动TCP劣化代理（后台线程）"""
+    listen_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listen_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listen_sock.bind((listen_host, listen_port))
+    listen_sock.listen(64)
+    listen_sock.settimeout(0.5)
+    threading.Thread(target=proxy_accept_loop, args=(listen_sock, target), daemon=True, name="ProxyAccept").start()
+    threading.Thread(target=impair_tick_loop, daemon=True, name="ProxyImpairTick").start()
+    log(f"🚀 TCP劣化代理启动 → {listen_host}:{listen_port} ⇄ {target[0]}:{target[1]}")
+    return listen_sock
+
+
+def proxy_queue_snapshot():
+    """统计代理内积压（下行积压≈服务器发往弱网客户端的发送队列）"""
+    with proxy_conns_lock:
+        conns = list(proxy_conns)
+    down_bytes = [conn["down"]["queued_bytes"] for conn in conns]
+    up_bytes = sum(conn["up"]["queued_bytes"] for conn in conns)
+    return len(conns), sum(down_bytes), max(down_bytes, default=0), up_bytes
+
+
+# ===================== UDP劣化代理（可选）=====================
+def start_udp_proxy(listen_host, listen_port, target):
+    """UDP劣化代理：每个客户端地址对应一个上游socket，报文按延迟/抖动/丢包调度"""
+    listen_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    listen_sock.bind((listen_host, listen_port))
+    listen_sock.settimeout(0.5)
+    schedule = []  # 小顶堆：(到期时间, 序号, 发送socket, 数据, 目标地址)
+    schedule_cond = threading.Condition()
+    upstreams = {}  # 客户端地址 → 上游socket
+    seq = [0]
+
+    def enqueue(send_sock, data, addr):
+        if impair_config["loss"] > 0 and random.random() < impair_config["loss"]:
+            return
+        due = time.monotonic() + max(0.0, impair_config["delay"] +
+                                     random.uniform(-impair_config["jitter"], impair_config["jitter"]))
+        with schedule_cond:
+            seq[0] += 1
+            heapq.heappush(schedule, (due, seq[0], send_sock, data, addr))
+            schedule_cond.notify()
+
+    def sender_loop():
+        while proxy_running:
+            with schedule_cond:
+                while not schedule and proxy_running:
+                    schedule_cond.wait(0.5)
+                if not schedule:
+                    continue
+                due = schedule[0][0]
+                now = time.monotonic()
+                if due > now:
+                    schedule_cond.wait(due - now)
+                    continue
+                _, _, send_sock, data, addr = heapq.heappop(schedule)
+            try:
+                send_sock.sendto(data, addr)
+            except OSError:
+                pass
+
+    def upstream_loop(client_addr, upstream_sock):
+        while proxy_running:
+            try:
+                data, _ = upstream_sock.recvfrom(RECV_CHUNK_SIZE)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            enqueue(listen_sock, data, client_addr)
+
+    def listen_loop():
+        while proxy_running:
+            try:
+                data, client_addr = listen_sock.recvfrom(RECV_CHUNK_SIZE)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            upstream_sock = upstreams.get(client_addr)
+            if upstream_sock is None:
+                upstream_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                upstream_sock.settimeout(0.5)
+                upstreams[client_addr] = upstream_sock
+                threading.Thread(target=upstream_loop, args=(client_addr, upstream_sock), daemon=True).start()
+                log(f"UDP代理新客户端[{client_addr[0]}:{client_addr[1]}]")
+            enqueue(upstream_sock, data, target)
+
+    threading.Thread(target=listen_loop, daemon=True, name="UdpProxyListen").start()
+    threading.Thread(target=sender_loop, daemon=True, name="UdpProxySend").start()
+    log(f"🚀 UDP劣化代理启动 → {listen_host}:{listen_port} ⇄ {target[0]}:{target[1]}（丢包率{impair_config['loss']:.1%}）")
+    return listen_sock
+
+
+# ===================== 浸泡测试 =====================
+def read_process_rss(pid):
+    """读取进程常驻内存（MB），无法读取时返回None"""
+    if pid is None:
+        return None
+    try:
+        if psutil is not None:
+            return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except Exception:
+        return None
+    return None
+
+
+def soak_client_loop(index, proxy_addr, soak_stats, stats_lock):
+    """脚本客户端：经代理连接服务器，随机发送按键/转向/开火命令，记录pos|广播的到达间隔"""
+    while proxy_running:
+        try:
+            sock = socket.create_connection(proxy_addr, timeout=5.0)
+        except OSError:
+            time.sleep(SOAK_RECONNECT_DELAY)
+            continue
+        sock.settimeout(0.02)
+        with stats_lock:
+            soak_stats["connects"] += 1
+        last_pos_time = None
+        next_cmd_time = time.monotonic() + random.uniform(*SOAK_CMD_INTERVAL)
+        try:
+            while proxy_running:
+                now = time.monotonic()
+                if now >= next_cmd_time:
+                    sock.sendall(random.choice(SOAK_COMMANDS))
+                    next_cmd_time = now + random.uniform(*SOAK_CMD_INTERVAL)
+                try:
+                    data = sock.recv(RECV_CHUNK_SIZE)
+                except socket.timeout:
+                    continue
+                if not data:
+                    raise ConnectionError("服务器关闭连接")
+                pos_count = data.count(b"pos|")
+                if pos_count:
+                    now = time.monotonic()
+                    with stats_lock:
+                        soak_stats["pos_msgs"] += pos_count
+                        if last_pos_time is not None:
+                            soak_stats["gaps"].append(now - last_pos_time)
+                    last_pos_time = now
+        except OSError:
+            with stats_lock:
+                soak_stats["disconnects"] += 1
+        finally:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        time.sleep(SOAK_RECONNECT_DELAY)
+
+
+def run_soak(args, proxy_addr):
+    """浸泡测试主流程：启动服务器与脚本客户端，周期性报告并输出汇总"""
+    server_proc = None
+    server_pid = args.server_pid
+    if not args.no_server:
+        server_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server142.py")
+        server_log = open(args.server_log, "w", encoding="utf-8") if args.server_log else subprocess.DEVNULL
+        server_proc = subprocess.Popen([sys.executable, server_path], stdout=server_log, stderr=subprocess.STDOUT,
+                                       cwd=os.path.dirname(server_path))
+        server_pid = server_proc.pid
+        log(f"已启动游戏服务器 PID={server_pid}（日志：{args.server_log or '丢弃'}）")
+        time.sleep(1.0)
+
+    soak_stats = {"pos_msgs": 0, "gaps": [], "connects": 0, "disconnects": 0}
+    stats_lock = threading.Lock()
+    for i in range(args.clients):
+        threading.Thread(target=soak_client_loop, args=(i, proxy_addr, soak_stats, stats_lock),
+                         daemon=True, name=f"SoakClient_{i}").start()
+    log(f"🧪 浸泡测试开始 → {args.clients}个脚本客户端，时长{args.duration}秒，报告间隔{args.report_interval}秒")
+
+    csv_file = None
+    csv_writer = None
+    if args.report_csv:
+        csv_file = open(args.report_csv, "w", newline="", encoding="utf-8")
+        csv_writer = csv.writer(csv_file)
+        csv_writer.writerow(["elapsed_s", "tick_rate_per_client", "gap_mean_ms", "gap_p99_ms", "gap_max_ms",
+                             "proxy_conns", "down_queue_bytes", "down_queue_max_bytes", "up_queue_bytes",
+                             "server_rss_mb", "connects", "disconnects", "server_disconnects", "resets", "stalls"])
+
+    summary = {"rss": [], "down_queue_max": 0, "tick_rates": [], "gap_max": 0.0}
+    start_time = time.monotonic()
+    last_report_time = start_time
+    try:
+        while time.monotonic() - start_time < args.duration:
+            time.sleep(min(args.report_interval, max(0.0, args.duration - (time.monotonic() - start_time))))
+            if server_proc is not None and server_proc.poll() is not None:
+                log_error(f"游戏服务器进程已退出（返回码{server_proc.returncode}），结束浸泡测试")
+                break
+
+            now = time.monotonic()
+            period = max(now - last_report_time, 1e-6)
+            last_report_time = now
+            with stats_lock:
+                pos_msgs = soak_stats["pos_msgs"]
+                gaps = sorted(soak_stats["gaps"])
+                connects, disconnects = soak_stats["connects"], soak_stats["disconnects"]
+                soak_stats["pos_msgs"] = 0
+                soak_stats["gaps"] = []
+            tick_rate = pos_msgs / period / max(args.clients, 1)
+            gap_mean = sum(gaps) / len(gaps) if gaps else 0.0
+            gap_p99 = percentile(gaps, 0.99)
+            gap_max = gaps[-1] if gaps else 0.0
+            conn_count, down_bytes, down_max, up_bytes = proxy_queue_snapshot()
+            rss = read_process_rss(server_pid)
+
+            summary["tick_rates"].append(tick_rate)
+            summary["gap_max"] = max(summary["gap_max"], gap_max)
+            summary["down_queue_max"] = max(summary["down_queue_max"], down_max)
+            if rss is not None:
+                summary["rss"].append(rss)
+
+            log(f"📊 浸泡{now - start_time:.0f}秒 → 帧率{tick_rate:.1f}/{SOAK_EXPECTED_TICK_RATE:.0f}每客户端"
+                f" | 间隔均值{gap_mean * 1000:.1f}ms p99{gap_p99 * 1000:.1f}ms 最大{gap_max * 1000:.1f}ms"
+                f" | 代理连接{conn_count} 下行积压{down_bytes}字节(单连接最大{down_max}) 上行积压{up_bytes}字节"
+                f" | 服务器内存{'%.1fMB' % rss if rss is not None else '未知'}"
+                f" | 连接{connects} 断开{disconnects}（服务器断开{proxy_stats['server_disconnects']}）"
+                f" 重置{proxy_stats['resets']} 卡顿{proxy_stats['stalls']}")
+            if csv_writer is not None:
+                csv_writer.writerow([f"{now - start_time:.1f}", f"{tick_rate:.2f}", f"{gap_mean * 1000:.1f}",
+                                     f"{gap_p99 * 1000:.1f}", f"{gap_max * 1000:.1f}", conn_count, down_bytes,
+                                     down_max, up_bytes, f"{rss:.1f}" if rss is not None else "",
+                                     connects, disconnects, proxy_stats["server_disconnects"],
+                                     proxy_stats["resets"], proxy_stats["stalls"]])
+                csv_file.flush()
+    except KeyboardInterrupt:
+        log("⚠️ 收到关闭信号，提前结束浸泡测试")
+    finally:
+        if csv_file is not None:
+            csv_file.close()
+        # 在停止服务器前取值：关闭服务器本身造成的断开不计入
+        summary["server_disconnects"] = proxy_stats["server_disconnects"]
+        if server_proc is not None:
+            server_proc.terminate()
+            try:
+                server_proc.wait(5.0)
+            except subprocess.TimeoutExpired:
+                server_proc.kill()
+
+    tick_rates = summary["tick_rates"]
+    rss_values = summary["rss"]
+    log("🧾 浸泡测试汇总 → "
+        f"帧率 最低{min(tick_rates, default=0):.1f} 平均{sum(tick_rates) / max(len(tick_rates), 1):.1f}"
+        f" | 最大到达间隔{summary['gap_max'] * 1000:.1f}ms"
+        f" | 单连接最大下行积压{summary['down_queue_max']}字节"
+        + (f" | 服务器内存 起始{rss_values[0]:.1f}MB 结束{rss_values[-1]:.1f}MB 峰值{max(rss_values):.1f}MB"
+           if rss_values else " | 服务器内存未知")
+        + f" | 服务器断开{summary['server_disconnects']}次"
+        + f" | 注入重置{proxy_stats['resets']}次 卡顿{proxy_stats['stalls']}次")
+
+
+# ===================== 启动入口 =====================
+def main(argv=None):
+    global proxy_running
+    parser = argparse.ArgumentParser(description="FPS_net本地网络劣化代理 / 浸泡测试")
+    parser.add_argument("--listen", type=int, default=PROXY_LISTEN_PORT, help="TCP代理监听端口")
+    parser.add_argument("--target", default=f"{TARGET_HOST}:{TARGET_PORT}", help="游戏服务器地址 host:port")
+    parser.add_argument("--delay", type=float, default=0.0, help="单向延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="抖动幅度（毫秒，±jitter均匀分布）")
+    parser.add_argument("--bandwidth", type=float, default=0.0, help="单向带宽上限（KB/秒，0=不限）")
+    parser.add_argument("--stall-prob", type=float, default=0.0, help="每连接每秒进入卡顿的概率")
+    parser.add_argument("--stall", type=float, default=1000.0, help="卡顿时长（毫秒）")
+    parser.add_argument("--reset-prob", type=float, default=0.0, help="每连接每秒被重置（RST）的概率")
+    parser.add_argument("--max-queued", type=float, default=MAX_QUEUED_BYTES / 1024,
+                        help="单向管道积压上限（KB），超出后停止读取并反压到发送端")
+    parser.add_argument("--udp-listen", type=int, default=0, help="UDP代理监听端口（0=不启用）")
+    parser.add_argument("--udp-target", default="", help="UDP目标地址 host:port")
+    parser.add_argument("--loss", type=float, default=0.0, help="UDP丢包率（0~1）")
+    parser.add_argument("--seed", type=int, help="随机种子（复现同一组劣化序列）")
+    soak_group = parser.add_argument_group("浸泡测试")
+    soak_group.add_argument("--soak", action="store_true", help="启用浸泡测试模式")
+    soak_group.add_argument("--clients", type=int, default=4, help="脚本客户端数量")
+    soak_group.add_argument("--duration", type=float, default=3600.0, help="测试时长（秒）")
+    soak_group.add_argument("--report-interval", type=float, default=SOAK_REPORT_INTERVAL, help="报告间隔（秒）")
+    soak_group.add_argument("--report-csv", help="报告输出CSV路径")
+    soak_group.add_argument("--no-server", action="store_true", help="不自动启动server142.py（连接已运行的服务器）")
+    soak_group.add_argument("--server-pid", type=int, help="已运行服务器的PID（用于采集内存）")
+    soak_group.add_argument("--server-log", help="自动启动的服务器日志输出路径（默认丢弃）")
+    args = parser.parse_args(argv)
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    impair_config.update(
+        delay=args.delay / 1000.0,
+        jitter=args.jitter / 1000.0,
+        bandwidth=args.bandwidth * 1024.0,
+        stall_prob=args.stall_prob,
+        stall=args.stall / 1000.0,
+        reset_prob=args.reset_prob,
+        loss=args.loss,
+        max_queued_bytes=max(1, int(args.max_queued * 1024)),
+    )
+    log(f"劣化参数：延迟{args.delay}ms 抖动±{args.jitter}ms 带宽{'不限' if args.bandwidth <= 0 else f'{args.bandwidth}KB/s'}"
+        f" 卡顿概率{args.stall_prob}/秒×{args.stall}ms 重置概率{args.reset_prob}/秒 积压上限{args.max_queued}KB")
+
+    target = parse_host_port(args.target, TARGET_PORT)
+    listen_sock = start_tcp_proxy(PROXY_LISTEN_HOST, args.listen, target)
+    udp_sock = None
+    if args.udp_listen:
+        if not args.udp_target:
+            parser.error("启用UDP代理需要--udp-target")
+        udp_sock = start_udp_proxy(PROXY_LISTEN_HOST, args.udp_listen, parse_host_port(args.udp_target, 0))
+
+    try:
+        if args.soak:
+            run_soak(args, ("127.0.0.1", args.listen))
+        else:
+            while True:
+                time.sleep(1.0)
+    except KeyboardInterrupt:
+        log("⚠️ 收到关闭信号，正在停止代理...")
+    finally:
+        proxy_running = False
+        listen_sock.close()
+        if udp_sock is not None:
+            udp_sock.close()
+        with proxy_conns_lock:
+            conns = list(proxy_conns)
+        for conn in conns:
+            close_conn(conn)
+        log("🔌 劣化代理已关闭")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except Exception as e:
+        log_error(f"劣化代理启动失败：{str(e)}")
+        sys.exit(1)
@@ -1,7 +1,14 @@
 import socket
 import threading
+import signal
 import sys
+import os
 import time
+import queue
+import sqlite3
+import mmap
+import struct
+import zlib
 from collections import defaultdict
 import math
 from datetime import datetime
@@ -9,12 +16,18 @@ from datetime import datetime
 # ===================== 全局配置（核心修改：帧率提升到20帧/秒）=====================
 client_sockets = []
 client_id_map = {}  # socket → player_id
+client_connect_times = {}  # player_id → 连接时间（用于统计在线时长），由client_lock保护
 client_lock = threading.Lock()  # 保护客户端映射的线程安全
+# 已协商压缩的连接：socket → 长期存活的zlib压缩流（跨帧复用字典，重复的ID/字段/坐标压缩率更高）
+client_compressors = {}
+# 压缩统计（原始字节、压缩后字节、压缩耗时、帧数），由client_lock保护
+compression_stats = {"raw_bytes": 0, "compressed_bytes": 0, "cpu_time": 0.0, "ticks": 0}
 next_player_id = 1
 CHECK_DEAD_CONN_INTERVAL = 5  # 死连接检测间隔
 MAX_MSG_PER_TICK = 10  # 限制单帧消息数
 MAX_MSG_PER_SECOND = 100  # 与客户端发送频率匹配
 SEND_BUFFER_SIZE = 4096  # 缓冲区大小
+RECV_BUFFER_SIZE = 1024  # 每连接预分配的接收缓冲区大小（recv_into复用，不再每次分配bytes）
 GAME_TICK_INTERVAL = 0.05  # 核心修改：从0.1→0.05秒（1/0.05=20帧/秒）
 MOVE_SPEED = 2.5  # 核心修改：从5.0→2.5（帧率翻倍，速度减半保证总移动速度不变）
 ROTATE_SPEED = 3.0  # 核心修改：从6.0→3.0（帧率翻倍，转向速度减半保证总转向速度不变）
@@ -28,9 +41,31 @@ PLAYER_COLLISION_RADIUS = 50.0  # 玩家碰撞半径（100×100×100立方体→
 FIRE_DAMAGE = 2  # 每次命中扣除HP（每帧2点）
 SCORE_PER_HIT = 1  # 每次命中增加的得分
 
+# 竞技场静态碰撞栅格（由export_arena_grid.py离线导出，启动时内存映射，射线遇墙截断）
+ARENA_GRID_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "arena_collision.grid")
+ARENA_GRID_MAGIC = b"FPSG"
+ARENA_GRID_VERSION = 1
+ARENA_GRID_HEADER = struct.Struct("<4sHHfffII")  # 须与export_arena_grid.py保持一致
+
 # 协议相关新增配置
 SCORE_BROADCAST_INTERVAL = 5.0  # 得分协议广播间隔（5秒）
 
+# 战绩持久化配置（SQLite本地存储，后台线程批量写入，不占用命中检测/主循环耗时）
+STATS_DB_ENABLED = True  # 是否启用战绩持久化
+STATS_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fps_stats.db")
+STATS_FLUSH_INTERVAL = 2.0  # 批量事务提交间隔（秒）
+STATS_QUEUE_MAX_SIZE = 10000  # 战绩事件队列上限（队列满时丢弃事件，保证不阻塞游戏逻辑）
+
+# 压缩传输配置（客户端握手发送c|z或c|z1~c|z9协商开启，之后该连接的下行消息走zlib流）
+COMPRESSION_ENABLED = True  # 是否允许客户端协商压缩
+COMPRESSION_LEVEL = 6  # 默认压缩等级（1=最快，9=压缩率最高）
+
+# 观战广播流配置（spectator_relay.py订阅一次广播流后向观众扇出，观众数量不增加游戏服务器每帧开销）
+SPECTATOR_FEED_ENABLED = True  # 是否开放观战广播流
+SPECTATOR_FEED_HOST = "127.0.0.1"  # 仅允许本机中继进程订阅
+SPECTATOR_FEED_PORT = 8889
+SPECTATOR_FEED_QUEUE_MAX_SIZE = 1000  # 广播流待发送上限（中继过慢时丢弃，不阻塞主循环）
+
 # 玩家状态（含动画状态）
 player_states = defaultdict(dict)
 player_key_states = defaultdict(lambda: {"W": False, "S": False, "A": False, "D": False})
@@ -44,6 +79,8 @@ fire_lock_states = defaultdict(dict)
 hit_players = defaultdict(bool)
 # 命中结果记录（用于判断是否真的命中）
 fire_hit_results = defaultdict(bool)
+# 竞技场碰撞栅格（启动时加载一次，只读；None表示无遮挡）
+arena_grid = None
 
 # 线程安全锁（新增score_lock保护得分字典）
 state_lock = threading.Lock()
@@ -53,6 +90,17 @@ fire_lock = threading.Lock()  # 保护开火/命中状态
 score_lock = threading.Lock()  # 新增：保护得分字典的线程锁
 last_stats_print_time = time.time()
 
+# 战绩事件队列（游戏线程只投递，后台写入线程负责落盘）
+stats_event_queue = queue.Queue(maxsize=STATS_QUEUE_MAX_SIZE)
+stats_dropped_events = 0  # 因队列满被丢弃的事件数
+stats_dropped_lock = threading.Lock()  # 保护丢弃计数（多个客户端线程同时投递）
+stats_writer_thread = None
+
+# 观战广播流（主循环只投递，发送线程以换行分帧写给已订阅的中继进程）
+spectator_feed_queue = queue.Queue(maxsize=SPECTATOR_FEED_QUEUE_MAX_SIZE)
+spectator_feed_subscribers = []
+spectator_feed_lock = threading.Lock()  # 保护中继订阅列表
+
 # 协议映射（k|f=开火按住，k|nf=开火松开）
 KEY_PROTOCOL_MAP = {
     # 移动按键
@@ -68,6 +116,34 @@ KEY_PROTOCOL_MAP = {
     "f": ("FIRE", True),  # 开火按住（鼠标左键按下）
     "nf": ("FIRE", False)  # 开火松开（鼠标左键松开）
 }
+FIRE_PRESS_ACTION = KEY_PROTOCOL_MAP["f"]
+
+# 协议字节常量（字节级解析用）
+BYTE_K = ord("k")
+BYTE_M = ord("m")
+BYTE_C = ord("c")
+BYTE_Z = ord("z")
+BYTE_1 = ord("1")
+BYTE_9 = ord("9")
+BYTE_N = ord("n")
+BYTE_F = ord("f")
+BYTE_PIPE = ord("|")
+BYTE_SPACE = ord(" ")
+
+
+def build_byte_action_tables():
+    """预计算字节→动作表（以按键码/转向码字节直接下标查表，替代KEY_PROTOCOL_MAP字符串查找）"""
+    key_table = [None] * 256
+    for code, action in KEY_PROTOCOL_MAP.items():
+        if len(code) == 1:  # 双字节的"nf"由解析器预读处理
+            key_table[ord(code)] = action
+    rotate_table = [None] * 256
+    for code in ("l", "r", "s"):
+        rotate_table[ord(code)] = code
+    return key_table, rotate_table
+
+
+KEY_BYTE_ACTIONS, ROTATE_BYTE_CODES = build_byte_action_tables()
 
 # 玩家默认状态（ani_id：0=Idle 1=Move 2=开火 3=受伤）
 DEFAULT_PLAYER_STATE = {
@@ -105,6 +181,7 @@ def print_command_and_state_stats():
     while game_running:
         current_time = time.time()
         if current_time - last_stats_print_time >= 1.0:
+            print_compression_stats()
             with stats_lock:
                 with state_lock:
                     with fire_lock:
@@ -131,6 +208,23 @@ def print_command_and_state_stats():
         time.sleep(0.1)
 
 
+def print_compression_stats():
+    """打印压缩统计：压缩率与每帧压缩CPU耗时（用于在带宽与CPU之间权衡压缩等级）"""
+    with client_lock:
+        compressed_conns = len(client_compressors)
+        raw_bytes = compression_stats["raw_bytes"]
+        compressed_bytes = compression_stats["compressed_bytes"]
+        cpu_time = compression_stats["cpu_time"]
+        ticks = compression_stats["ticks"]
+        compression_stats.update(raw_bytes=0, compressed_bytes=0, cpu_time=0.0, ticks=0)
+    if compressed_conns == 0 or raw_bytes == 0:
+        return
+    ratio = compressed_bytes / raw_bytes
+    cpu_ms_per_tick = cpu_time * 1000 / max(ticks, 1)
+    log(f"🗜️ 压缩统计 → {compressed_conns}个压缩连接 | 原始{raw_bytes}字节→压缩{compressed_bytes}字节（压缩率{ratio:.1%}）"
+        f" | 压缩耗时{cpu_ms_per_tick:.3f}ms/帧（{ticks}帧）")
+
+
 def init_player(pid):
     """初始化玩家状态（新增得分/死亡标记初始化）"""
     try:
@@ -205,6 +299,89 @@ def ray_sphere_intersection(ray_origin_x, ray_origin_y, ray_dir_x, ray_dir_y,
     return True, t
 
 
+def load_arena_grid(path):
+    """加载竞技场碰撞栅格（内存映射，只读）；文件不存在或格式错误时返回None（射线不受遮挡）"""
+    if not os.path.exists(path):
+        log(f"未找到竞技场碰撞栅格{path}，命中检测不做墙体遮挡")
+        return None
+    try:
+        with open(path, "rb") as f:
+            grid_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, cell_size, origin_x, origin_y, width, height = \
+            ARENA_GRID_HEADER.unpack_from(grid_map, 0)
+        if magic != ARENA_GRID_MAGIC or version != ARENA_GRID_VERSION:
+            raise ValueError(f"文件头不匹配（magic={magic!r}，version={version}）")
+        if cell_size <= 0 or len(grid_map) < ARENA_GRID_HEADER.size + width * height:
+            raise ValueError("栅格尺寸与文件长度不符")
+        grid = {
+            "map": grid_map,  # 保持映射存活
+            "cells": memoryview(grid_map)[ARENA_GRID_HEADER.size:ARENA_GRID_HEADER.size + width * height],
+            "cell_size": cell_size,
+            "origin_x": origin_x,
+            "origin_y": origin_y,
+            "width": width,
+            "height": height,
+        }
+        log(f"竞技场碰撞栅格加载完成：{width}×{height}，格子{cell_size:.1f}单位，原点({origin_x:.1f},{origin_y:.1f})")
+        return grid
+    except Exception as e:
+        log_error(f"加载竞技场碰撞栅格失败：{str(e)}，命中检测不做墙体遮挡")
+        return None
+
+
+def trace_wall_distance(ray_origin_x, ray_origin_y, ray_dir_x, ray_dir_y, max_distance):
+    """
+    射线在碰撞栅格中逐格步进（DDA），返回到第一个墙体格子的距离；无遮挡返回max_distance
+    步进次数不超过 2×max_distance/格子边长，单次开火耗时有上界
+    """
+    grid = arena_grid
+    if grid is None:
+        return max_distance
+    cells = grid["cells"]
+    width = grid["width"]
+    height = grid["height"]
+    cell_size = grid["cell_size"]
+
+    # 射线起点换算到栅格坐标
+    gx = (ray_origin_x - grid["origin_x"]) / cell_size
+    gy = (ray_origin_y - grid["origin_y"]) / cell_size
+    cell_x = math.floor(gx)
+    cell_y = math.floor(gy)
+
+    # 每个轴上跨越一格所需的射线长度，及到达下一条格线的射线长度
+    if ray_dir_x > 0:
+        step_x, t_delta_x = 1, cell_size / ray_dir_x
+        t_max_x = (cell_x + 1 - gx) * t_delta_x
+    elif ray_dir_x < 0:
+        step_x, t_delta_x = -1, -cell_size / ray_dir_x
+        t_max_x = (gx - cell_x) * t_delta_x
+    else:
+        step_x, t_delta_x, t_max_x = 0, math.inf, math.inf
+    if ray_dir_y > 0:
+        step_y, t_delta_y = 1, cell_size / ray_dir_y
+        t_max_y = (cell_y + 1 - gy) * t_delta_y
+    elif ray_dir_y < 0:
+        step_y, t_delta_y = -1, -cell_size / ray_dir_y
+        t_max_y = (gy - cell_y) * t_delta_y
+    else:
+        step_y, t_delta_y, t_max_y = 0, math.inf, math.inf
+
+    # 起点所在格子不参与判定（栅格为保守覆盖，贴墙站立的玩家仍可向外开火）
+    while True:
+        if t_max_x < t_max_y:
+            t = t_max_x
+            t_max_x += t_delta_x
+            cell_x += step_x
+        else:
+            t = t_max_y
+            t_max_y += t_delta_y
+            cell_y += step_y
+        if t > max_distance:
+            return max_distance
+        if 0 <= cell_x < width and 0 <= cell_y < height and cells[cell_y * width + cell_x]:
+            return t
+
+
 def broadcast_death_protocol(pid):
     """新增：广播死亡协议（d|id）给所有客户端"""
     if player_death_flag.get(pid, False):
@@ -218,6 +395,7 @@ def broadcast_death_protocol(pid):
         for sock in list(client_sockets):
             if not safe_send(sock, death_msg):
                 dead_sockets.append(sock)
+    publish_spectator_feed(death_msg)
 
     # 清理发送失败的死连接
     if dead_sockets:
@@ -226,6 +404,7 @@ def broadcast_death_protocol(pid):
                 if sock in client_sockets:
                     client_sockets.remove(sock)
                 client_id_map.pop(sock, None)
+                client_compressors.pop(sock, None)
                 try:
                     sock.close()
                 except:
@@ -271,6 +450,7 @@ def send_score_protocol_loop():
             for sock in list(client_sockets):
                 if not safe_send(sock, score_msg):
                     dead_sockets.append(sock)
+        publish_spectator_feed(score_msg)
 
         # 清理发送失败的死连接
         if dead_sockets:
@@ -279,6 +459,7 @@ def send_score_protocol_loop():
                     if sock in client_sockets:
                         client_sockets.remove(sock)
                     client_id_map.pop(sock, None)
+                    client_compressors.pop(sock, None)
                     try:
                         sock.close()
                     except:
@@ -286,85 +467,250 @@ def send_score_protocol_loop():
             log(f"发送得分协议时清理{len(dead_sockets)}个失效连接")
 
 
-def check_fire_hit(fire_pid):
-    """
-    重构命中检测：基于前向向量射线+球体碰撞（新增命中加分、HP归零发送死亡协议）
-    返回：是否命中
-    """
+# ===================== 战绩持久化（SQLite + 后台批量写入）=====================
+STATS_DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    match_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    start_time TEXT NOT NULL,
+    end_time TEXT
+);
+CREATE TABLE IF NOT EXISTS player_match_stats (
+    match_id INTEGER NOT NULL,
+    pid INTEGER NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    damage_dealt INTEGER NOT NULL DEFAULT 0,
+    damage_taken INTEGER NOT NULL DEFAULT 0,
+    deaths INTEGER NOT NULL DEFAULT 0,
+    score INTEGER NOT NULL DEFAULT 0,
+    session_time REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (match_id, pid)
+);
+"""
+
+# 累加写入（同一局同一玩家多次提交时在原值上叠加）
+STATS_UPSERT_SQL = """
+INSERT INTO player_match_stats
+    (match_id, pid, hits, damage_dealt, damage_taken, deaths, score, session_time)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(match_id, pid) DO UPDATE SET
+    hits = hits + excluded.hits,
+    damage_dealt = damage_dealt + excluded.damage_dealt,
+    damage_taken = damage_taken + excluded.damage_taken,
+    deaths = deaths + excluded.deaths,
+    score = score + excluded.score,
+    session_time = session_time + excluded.session_time
+"""
+
+
+def record_stats_event(event_type, pid, **fields):
+    """投递战绩事件（非阻塞，仅入队；队列满时丢弃，不影响游戏线程）"""
+    global stats_dropped_events
+    if not STATS_DB_ENABLED:
+        return
     try:
-        with state_lock:
-            # 1. 校验开火玩家状态
-            if fire_pid not in player_states:
-                log_error(f"开火玩家{fire_pid}状态不存在，跳过命中检测")
-                return False
-            fire_state = player_states[fire_pid]
-            # 射线起点：开火玩家中心
-            ray_origin_x = fire_state["x"]
-            ray_origin_y = fire_state["y"]
-            # 射线方向：开火玩家前向单位向量
-            ray_dir_x, ray_dir_y = calculate_forward(fire_state["yaw"])
+        stats_event_queue.put_nowait((event_type, pid, fields))
+    except queue.Full:
+        with stats_dropped_lock:
+            stats_dropped_events += 1
+
+
+def apply_stats_event(pending, event):
+    """将单个事件累加到待提交的增量表（pid → [命中, 造成伤害, 承受伤害, 死亡, 得分, 在线时长]）"""
+    event_type, pid, fields = event
+    delta = pending.setdefault(pid, [0, 0, 0, 0, 0, 0.0])
+    if event_type == "hit":
+        delta[0] += 1
+        delta[1] += fields.get("damage", 0)
+        delta[4] += fields.get("score", 0)
+        target_pid = fields.get("target")
+        if target_pid is not None:
+            target_delta = pending.setdefault(target_pid, [0, 0, 0, 0, 0, 0.0])
+            target_delta[2] += fields.get("damage", 0)
+    elif event_type == "death":
+        delta[3] += 1
+    elif event_type == "session":
+        delta[5] += fields.get("duration", 0.0)
+
+
+def flush_stats(conn, match_id, pending):
+    """在一个事务内批量提交增量"""
+    if not pending:
+        return
+    rows = [(match_id, pid, *delta) for pid, delta in pending.items()]
+    with conn:
+        conn.executemany(STATS_UPSERT_SQL, rows)
+    pending.clear()
 
-        hit_targets = []
-        has_hit = False
 
-        with state_lock:
-            # 2. 遍历所有玩家检测射线碰撞
-            for pid in player_states.keys():
-                if pid == fire_pid:  # 跳过自己
-                    continue
-                target_state = player_states[pid]
-                # 球体中心：目标玩家中心
-                sphere_center_x = target_state["x"]
-                sphere_center_y = target_state["y"]
-
-                # 3. 执行射线-球体碰撞检测
-                is_hit, hit_distance = ray_sphere_intersection(
-                    ray_origin_x, ray_origin_y,
-                    ray_dir_x, ray_dir_y,
-                    sphere_center_x, sphere_center_y,
-                    PLAYER_COLLISION_RADIUS
-                )
+def stats_writer_loop():
+    """战绩写入线程：攒批事件，每STATS_FLUSH_INTERVAL秒提交一次事务，停服时提交剩余事件"""
+    try:
+        conn = sqlite3.connect(STATS_DB_PATH)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(STATS_DB_SCHEMA)
+        with conn:
+            cursor = conn.execute("INSERT INTO matches (start_time) VALUES (?)",
+                                  (datetime.now().isoformat(timespec="seconds"),))
+        match_id = cursor.lastrowid
+    except Exception as e:
+        log_error(f"战绩数据库初始化失败：{str(e)}，本局不记录战绩")
+        return
+
+    log(f"战绩写入线程启动 → 数据库：{STATS_DB_PATH}，对局ID={match_id}，提交间隔{STATS_FLUSH_INTERVAL}秒")
+    pending = {}
+    last_flush_time = time.time()
+    while True:
+        try:
+            apply_stats_event(pending, stats_event_queue.get(timeout=0.2))
+            # 一次性取空队列，减少唤醒次数
+            while True:
+                apply_stats_event(pending, stats_event_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        stopping = not game_running and stats_event_queue.empty()
+        if stopping or time.time() - last_flush_time >= STATS_FLUSH_INTERVAL:
+            try:
+                flush_stats(conn, match_id, pending)
+            except Exception as e:
+                log_error(f"战绩批量提交失败：{str(e)}")
+                pending.clear()
+            last_flush_time = time.time()
+        if stopping:
+            break
 
-                # 4. 判定有效命中（碰撞且在射线长度内）
-                if is_hit and hit_distance > 0 and hit_distance <= FIRE_RAY_LENGTH:
-                    hit_targets.append((pid, hit_distance))
+    try:
+        with conn:
+            conn.execute("UPDATE matches SET end_time = ? WHERE match_id = ?",
+                         (datetime.now().isoformat(timespec="seconds"), match_id))
+        conn.close()
+    except Exception as e:
+        log_error(f"战绩数据库关闭失败：{str(e)}")
+    if stats_dropped_events:
+        log_error(f"战绩事件队列溢出，共丢弃{stats_dropped_events}条事件")
+    log(f"战绩写入线程退出（对局ID={match_id}）")
 
-        # 5. 处理命中结果（取最近的目标，避免穿透）
-        if hit_targets:
-            # 按碰撞距离排序，取最近的目标
-            hit_targets.sort(key=lambda x: x[1])
-            closest_pid, closest_distance = hit_targets[0]
 
-            with fire_lock:
-                with state_lock:
-                    # 扣血（最低0）
-                    old_hp = player_states[closest_pid]["hp"]
-                    player_states[closest_pid]["hp"] = max(0, old_hp - FIRE_DAMAGE)
-                    new_hp = player_states[closest_pid]["hp"]
+def start_stats_writer():
+    """启动战绩写入线程"""
+    global stats_writer_thread
+    if not STATS_DB_ENABLED:
+        log("战绩持久化未启用")
+        return
+    stats_writer_thread = threading.Thread(target=stats_writer_loop, daemon=True, name="StatsWriter")
+    stats_writer_thread.start()
 
-                    # 标记为受伤（播放ani=3）
-                    hit_players[closest_pid] = True
 
-                    # 新增：命中玩家加分
-                    with score_lock:
-                        player_scores[fire_pid] += SCORE_PER_HIT
+def record_open_sessions():
+    """停服时为仍在线的玩家补记在线时长（须在停止写入线程前调用）"""
+    now = time.time()
+    with client_lock:
+        sessions = [(pid, client_connect_times.pop(pid)) for pid in client_id_map.values()
+                    if pid in client_connect_times]
+    for pid, connect_time in sessions:
+        record_stats_event("session", pid, duration=now - connect_time)
 
-                    # 绿色打印命中日志（新增得分信息）
-                    log_hit(
-                        f"玩家{fire_pid}命中玩家{closest_pid}！碰撞距离：{closest_distance:.1f}单位，扣除{FIRE_DAMAGE}HP，剩余HP：{new_hp} | 玩家{fire_pid}得分+{SCORE_PER_HIT}（当前：{player_scores[fire_pid]}）")
 
-                    # 新增：判断目标玩家HP是否归零，若是则发送死亡协议
-                    if new_hp <= 0 and not player_death_flag[closest_pid]:
-                        broadcast_death_protocol(closest_pid)
+def stop_stats_writer(timeout=5.0):
+    """停服时等待战绩写入线程提交剩余事件"""
+    if stats_writer_thread is not None and stats_writer_thread.is_alive():
+        stats_writer_thread.join(timeout)
 
-            has_hit = True
-        else:
-            log(f"玩家{fire_pid}开火未命中任何目标（射线长度：{FIRE_RAY_LENGTH}单位，碰撞半径：{PLAYER_COLLISION_RADIUS}单位）")
 
-        return has_hit
+def find_fire_target(fire_pid, snapshot):
+    """
+    基于前向向量射线+球体碰撞查找开火玩家命中的最近目标（只读位置快照，不加锁）
+    snapshot：pid → (x, y, yaw, hp)
+    返回：(目标pid, 碰撞距离)，未命中返回None
+    """
+    ray_origin_x, ray_origin_y, fire_yaw, _ = snapshot[fire_pid]
+    ray_dir_x, ray_dir_y = calculate_forward(fire_yaw)
+    # 射线遇到第一堵墙即截断（静态栅格只读，无需加锁）
+    ray_length = trace_wall_distance(ray_origin_x, ray_origin_y, ray_dir_x, ray_dir_y, FIRE_RAY_LENGTH)
+
+    closest = None
+    for pid, (target_x, target_y, _, target_hp) in snapshot.items():
+        if pid == fire_pid or target_hp <= 0:  # 跳过自己和已死亡玩家
+            continue
+        is_hit, hit_distance = ray_sphere_intersection(
+            ray_origin_x, ray_origin_y,
+            ray_dir_x, ray_dir_y,
+            target_x, target_y,
+            PLAYER_COLLISION_RADIUS
+        )
+        # 有效命中：碰撞且在截断后的射线长度内，取最近的目标（避免穿透）
+        if is_hit and 0 < hit_distance <= ray_length:
+            if closest is None or hit_distance < closest[1]:
+                closest = (pid, hit_distance)
+    return closest
+
+
+def resolve_fire_batch():
+    """
+    开火结算阶段（每帧由主循环调用一次）：
+    所有处于开火锁定或有待结算点射的玩家基于同一份位置快照统一计算射线，再一次性批量扣血、加分、标记受伤，
+    锁外统一打印命中日志、广播死亡协议
+    """
+    try:
+        with fire_lock:
+            shooters = []
+            for pid, lock_state in fire_lock_states.items():
+                if lock_state.get("is_locked") or lock_state.get("shot_pending"):
+                    shooters.append(pid)
+                    lock_state["shot_pending"] = False
+        if not shooters:
+            return
+
+        # 1. 拍摄位置快照（一次加锁）
+        with state_lock:
+            snapshot = {pid: (s["x"], s["y"], s["yaw"], s["hp"]) for pid, s in player_states.items()}
+
+        # 2. 统一计算所有射线（不持锁）
+        hits = []
+        fire_results = {}
+        for fire_pid in shooters:
+            if fire_pid not in snapshot or snapshot[fire_pid][3] <= 0:  # 状态不存在或已死亡不能开火
+                fire_results[fire_pid] = False
+                continue
+            target = find_fire_target(fire_pid, snapshot)
+            fire_results[fire_pid] = target is not None
+            if target is not None:
+                hits.append((fire_pid, target[0], target[1]))
+
+        # 3. 批量结算（一次加锁）
+        hit_logs = []
+        dead_pids = []
+        with state_lock:
+            with fire_lock:
+                with score_lock:
+                    for fire_pid, target_pid, hit_distance in hits:
+                        target_state = player_states.get(target_pid)
+                        if target_state is None or target_state["hp"] <= 0:
+                            continue
+                        old_hp = target_state["hp"]
+                        target_state["hp"] = max(0, old_hp - FIRE_DAMAGE)
+                        new_hp = target_state["hp"]
+                        # 标记为受伤（播放ani=3）
+                        hit_players[target_pid] = True
+                        player_scores[fire_pid] += SCORE_PER_HIT
+                        record_stats_event("hit", fire_pid, target=target_pid,
+                                           damage=old_hp - new_hp, score=SCORE_PER_HIT)
+                        hit_logs.append(
+                            f"玩家{fire_pid}→玩家{target_pid}（距离{hit_distance:.1f}，HP{new_hp}，得分{player_scores[fire_pid]}）")
+                        # HP归零则记录死亡，锁外广播死亡协议
+                        if new_hp <= 0 and not player_death_flag[target_pid]:
+                            record_stats_event("death", target_pid)
+                            dead_pids.append(target_pid)
+                    fire_hit_results.update(fire_results)
+
+        # 4. 锁外输出日志、广播死亡协议
+        if hit_logs:
+            # 绿色打印本帧全部命中（每次命中扣除FIRE_DAMAGE点HP，得分+SCORE_PER_HIT）
+            log_hit(f"本帧命中{len(hit_logs)}次（扣除{FIRE_DAMAGE}HP/次，得分+{SCORE_PER_HIT}/次）：" + "；".join(hit_logs))
+        for pid in dead_pids:
+            broadcast_death_protocol(pid)
     except Exception as e:
-        log_error(f"命中检测失败：{str(e)}")
-        return False
+        log_error(f"开火结算失败：{str(e)}")
 
 
 # ===================== 状态更新函数（无核心修改）=====================
@@ -462,95 +808,150 @@ def update_player_rotation(pid):
         log_error(f"更新玩家{pid}转向失败：{str(e)}")
 
 
-# ===================== 协议解析（无核心修改）=====================
-def parse_client_protocol(pid, msg, client_sock):
-    """解析客户端协议：处理k|f（开火按住）、k|nf（开火松开）"""
-    try:
-        msg = msg.strip()
-        if not msg or len(msg) < 2:
-            log_error(f"玩家{pid}发送空消息，忽略")
+# ===================== 协议解析（字节级解析，直接读取接收缓冲区）=====================
+def handle_fire_press(pid):
+    """处理开火按住（k|f）：定格位置/转向并登记一发待结算射击，命中检测由主循环的开火结算阶段每帧执行"""
+    with state_lock:
+        if pid not in player_states:
+            log_error(f"玩家{pid}状态不存在，无法开火")
+            return
+        # 1. 定格当前位置和转向
+        fire_state = player_states[pid]
+        lock_x = fire_state["x"]
+        lock_y = fire_state["y"]
+        lock_yaw = fire_state["yaw"]
+    with fire_lock:
+        # 2. 标记为开火锁定状态；shot_pending保证同一帧内按下又松开（点射）也至少结算一次
+        fire_lock_states[pid] = {
+            "is_locked": True,
+            "shot_pending": True,
+            "lock_x": lock_x,
+            "lock_y": lock_y,
+            "lock_yaw": lock_yaw
+        }
+    # 3. 设置开火动画（无论是否命中都播放）
+    with state_lock:
+        player_states[pid]["ani_id"] = 2
+    log(f"玩家{pid}按住开火，定格位置({lock_x:.1f},{lock_y:.1f})，转向{lock_yaw:.1f}°")
+
+
+def handle_fire_release(pid):
+    """处理开火松开（k|nf）：解除开火锁定（尚未结算的点射保留到本帧开火结算）"""
+    with fire_lock:
+        if pid in fire_lock_states:
+            fire_lock_states[pid]["is_locked"] = False
+    log(f"玩家{pid}松开开火，恢复移动/转向权限")
+
+
+def handle_key_action(pid, key_name, is_pressed):
+    """处理普通移动按键"""
+    with state_lock:
+        player_key_states[pid][key_name] = is_pressed
+    log(f"玩家{pid}按键更新：{key_name}={'按下' if is_pressed else '松开'}")
+
+
+def handle_rotate_action(pid, rotate_code):
+    """处理转向协议（m|l/r/s）"""
+    with state_lock:
+        player_rotate_states[pid] = rotate_code
+    log(f"玩家{pid}转向更新：{'左转向' if rotate_code == 'l' else '右转向' if rotate_code == 'r' else '停止转向'}")
+
+
+def handle_compression_request(pid, client_sock, level):
+    """处理压缩协商（c|z / c|z1~9）：明文回复c|z|等级，之后该连接的下行消息改为zlib流（Z_SYNC_FLUSH分帧）"""
+    if not COMPRESSION_ENABLED:
+        log_error(f"玩家{pid}请求压缩传输，但服务器未启用压缩，继续使用明文")
+        return
+    with client_lock:
+        if client_sock in client_compressors:
+            log_error(f"玩家{pid}重复请求压缩传输，忽略")
             return
+        # 回复必须在切换压缩之前以明文发出
+        if not safe_send(client_sock, f"c|z|{level}"):
+            return
+        client_compressors[client_sock] = zlib.compressobj(level)
+    log(f"玩家{pid}开启压缩传输（zlib等级{level}）")
+
+
+def parse_client_bytes(pid, view, start, end, max_commands, client_sock, settle_tail=False):
+    """
+    从接收缓冲区view[start:end]中逐字节解析命令（k|xx / m|x / c|z），查预计算字节表分发
+    客户端发送的命令没有分隔符，可能多条粘连在一次recv中；末尾不完整的命令保留到下次解析
+    末尾的k|n（可能是k|nf的前半段）、c|z（可能紧跟等级数字）同样保留，settle_tail=True时按完整命令处理
+    返回：(下一个未解析位置, 本次解析的命令数)
+    """
+    pos = start
+    parsed = 0
+    while pos < end and parsed < max_commands:
+        head = view[pos]
+        # 跳过空白/换行（兼容带换行的客户端）
+        if head <= BYTE_SPACE:
+            pos += 1
+            continue
+        # 协议头必须是 k| 、m| 或 c|，否则跳到下一个可能的协议头重新同步
+        if head != BYTE_K and head != BYTE_M and head != BYTE_C:
+            skip_start = pos
+            while pos < end and view[pos] != BYTE_K and view[pos] != BYTE_M and view[pos] != BYTE_C:
+                pos += 1
+            log_error(f"玩家{pid}无效协议，丢弃{pos - skip_start}字节（支持：k|xx/m|xx/c|z）")
+            continue
+        # 不完整的命令（最短3字节），等待后续数据
+        if end - pos < 3:
+            break
+        if view[pos + 1] != BYTE_PIPE:
+            log_error(f"玩家{pid}{'按键' if head == BYTE_K else '转向' if head == BYTE_M else '压缩'}协议格式错误，缺少分隔符")
+            pos += 1
+            continue
+
+        # k|n 与 k|nf、c|z 与 c|z1~9 前3字节相同：需要第4字节才能区分（后续命令只会以k/m/c开头，不会与'f'/数字混淆）
+        code = view[pos + 2]
+        has_suffix = (head == BYTE_K and code == BYTE_N) or (head == BYTE_C and code == BYTE_Z)
+        if has_suffix and end - pos == 3 and not settle_tail:
+            break
+        suffix = view[pos + 3] if has_suffix and end - pos > 3 else 0
+        if head == BYTE_K:
+            cmd_len = 4 if suffix == BYTE_F else 3
+        else:
+            cmd_len = 4 if BYTE_1 <= suffix <= BYTE_9 else 3
 
         # 限制每秒消息数
         with stats_lock:
             if command_stats[pid] >= MAX_MSG_PER_SECOND:
-                log_error(f"玩家{pid}消息频率超限，忽略消息：{msg}")
-                return
+                log_error(f"玩家{pid}消息频率超限，忽略消息")
+                pos += cmd_len
+                continue
             command_stats[pid] += 1
 
-        # 处理按键协议（k|key_code）
-        if msg.startswith("k|"):
-            parts = msg.split("|", 2)
-            if len(parts) < 2 or parts[1].strip() == "":
-                log_error(f"玩家{pid}按键协议格式错误：{msg}")
-                return
-            key_code = parts[1].strip()
-            if key_code not in KEY_PROTOCOL_MAP:
-                log_error(f"玩家{pid}未知按键码：{key_code}（支持：{list(KEY_PROTOCOL_MAP.keys())}）")
-                return
-
-            # 处理开火按住（k|f）
-            if key_code == "f":
-                with state_lock:
-                    if pid not in player_states:
-                        log_error(f"玩家{pid}状态不存在，无法开火")
-                        return
-                    # 1. 定格当前位置和转向
-                    fire_state = player_states[pid]
-                    lock_x = fire_state["x"]
-                    lock_y = fire_state["y"]
-                    lock_yaw = fire_state["yaw"]
-                with fire_lock:
-                    # 2. 标记为开火锁定状态
-                    fire_lock_states[pid] = {
-                        "is_locked": True,
-                        "lock_x": lock_x,
-                        "lock_y": lock_y,
-                        "lock_yaw": lock_yaw
-                    }
-                # 3. 执行命中检测（仅命中时才扣血）
-                has_hit = check_fire_hit(pid)
-                with fire_lock:
-                    fire_hit_results[pid] = has_hit
-                # 4. 设置开火动画（无论是否命中都播放）
-                with state_lock:
-                    player_states[pid]["ani_id"] = 2
-                log(f"玩家{pid}按住开火，定格位置({lock_x:.1f},{lock_y:.1f})，转向{lock_yaw:.1f}°")
-                return
-
-            # 处理开火松开（k|nf）
-            elif key_code == "nf":
-                with fire_lock:
-                    # 1. 解除开火锁定
-                    if pid in fire_lock_states:
-                        fire_lock_states[pid]["is_locked"] = False
-                log(f"玩家{pid}松开开火，恢复移动/转向权限")
-                return
-
-            # 处理普通移动按键
-            key_name, is_pressed = KEY_PROTOCOL_MAP[key_code]
-            with state_lock:
-                player_key_states[pid][key_name] = is_pressed
-            log(f"玩家{pid}按键更新：{key_name}={'按下' if is_pressed else '松开'}")
-
-        # 处理转向协议（m|rotate_code）
-        elif msg.startswith("m|"):
-            parts = msg.split("|", 2)
-            if len(parts) < 2 or parts[1].strip() == "":
-                log_error(f"玩家{pid}转向协议格式错误：{msg}")
-                return
-            rotate_code = parts[1].strip()
-            if rotate_code not in ["l", "r", "s"]:
-                log_error(f"玩家{pid}未知转向码：{rotate_code}")
-                return
-            with state_lock:
-                player_rotate_states[pid] = rotate_code
-            log(f"玩家{pid}转向更新：{'左转向' if rotate_code == 'l' else '右转向' if rotate_code == 'r' else '停止转向'}")
-
-        else:
-            log_error(f"玩家{pid}无效协议：{msg}（支持：k|xx/m|xx）")
-    except Exception as e:
-        log_error(f"解析玩家{pid}协议失败：{str(e)}")
+        pos += cmd_len
+        parsed += 1
+        try:
+            if head == BYTE_K:
+                if cmd_len == 4:  # k|nf 开火松开
+                    handle_fire_release(pid)
+                    continue
+                action = KEY_BYTE_ACTIONS[code]
+                if action is None:
+                    log_error(f"玩家{pid}未知按键码：{chr(code)}（支持：{list(KEY_PROTOCOL_MAP.keys())}）")
+                elif action is FIRE_PRESS_ACTION:
+                    handle_fire_press(pid)
+                else:
+                    handle_key_action(pid, action[0], action[1])
+            elif head == BYTE_C:
+                # c|z 可选紧跟一位压缩等级
+                level = suffix - BYTE_1 + 1 if cmd_len == 4 else COMPRESSION_LEVEL
+                if code != BYTE_Z:
+                    log_error(f"玩家{pid}未知压缩码：{chr(code)}（支持：z）")
+                else:
+                    handle_compression_request(pid, client_sock, level)
+            else:
+                rotate_code = ROTATE_BYTE_CODES[code]
+                if rotate_code is None:
+                    log_error(f"玩家{pid}未知转向码：{chr(code)}")
+                else:
+                    handle_rotate_action(pid, rotate_code)
+        except Exception as e:
+            log_error(f"解析玩家{pid}协议失败：{str(e)}")
+    return pos, parsed
 
 
 # ===================== 客户端处理（新增掉线发送死亡协议）=====================
@@ -562,6 +963,12 @@ def handle_client(client_sock, client_addr):
     last_tick_time = time.time()
     sock_valid = True
     client_ip, client_port = client_addr
+    # 每连接预分配接收缓冲区：recv_into直接写入，解析器通过memoryview读取，不产生临时bytes/str
+    recv_buf = bytearray(RECV_BUFFER_SIZE)
+    recv_view = memoryview(recv_buf)
+    read_pos = 0  # 下一个待解析字节
+    write_pos = 0  # 下一个待写入字节
+    last_recv_time = time.time()  # 最近一次收到数据的时间（末尾k|n/c|z超过一帧无后续即按完整命令处理）
 
     try:
         # Socket配置
@@ -576,6 +983,7 @@ def handle_client(client_sock, client_addr):
                 client_id_map[client_sock] = player_id
             if client_sock not in client_sockets:
                 client_sockets.append(client_sock)
+            client_connect_times[player_id] = time.time()
         init_player(player_id)
 
         # 发送ID给客户端
@@ -596,15 +1004,32 @@ def handle_client(client_sock, client_addr):
                 time.sleep(0.001)
                 continue
 
+            # 解析缓冲区中已收到的命令（单帧命令数受MAX_MSG_PER_TICK限制，超出部分留待下一帧）
+            if read_pos < write_pos:
+                read_pos, parsed = parse_client_bytes(
+                    player_id, recv_view, read_pos, write_pos,
+                    MAX_MSG_PER_TICK - msg_count, client_sock,
+                    settle_tail=current_time - last_recv_time >= GAME_TICK_INTERVAL
+                )
+                msg_count += parsed
+                if msg_count >= MAX_MSG_PER_TICK:
+                    continue
+
+            # 回收缓冲区：全部解析完直接复位；仅剩不完整命令时（至多几个字节）移到头部
+            if read_pos == write_pos:
+                read_pos = write_pos = 0
+            elif read_pos > 0:
+                remain = write_pos - read_pos
+                recv_buf[:remain] = bytes(recv_view[read_pos:write_pos])
+                read_pos, write_pos = 0, remain
+
             try:
-                data = client_sock.recv(1024)
-                if not data:
+                received = client_sock.recv_into(recv_view[write_pos:])
+                if received == 0:
                     log(f"客户端[{client_ip}:{client_port}]（ID={player_id}）主动断开连接")
                     break
-                msg = data.decode('utf-8', errors='replace').strip()
-                if msg:
-                    parse_client_protocol(player_id, msg, client_sock)
-                    msg_count += 1
+                write_pos += received
+                last_recv_time = time.time()
             except BlockingIOError:
                 time.sleep(0.001)
             except socket.error as e:
@@ -628,12 +1053,18 @@ def handle_client(client_sock, client_addr):
             # 新增：玩家掉线发送死亡协议
             if player_id != 0 and not player_death_flag.get(player_id, False):
                 broadcast_death_protocol(player_id)
+            # 记录本次在线时长（停服时已由record_open_sessions补记的不再重复记录）
+            with client_lock:
+                connect_time = client_connect_times.pop(player_id, None)
+            if connect_time is not None:
+                record_stats_event("session", player_id, duration=time.time() - connect_time)
 
             # 1. 清理Socket映射
             with client_lock:
                 if client_sock in client_sockets:
                     client_sockets.remove(client_sock)
                 client_id_map.pop(client_sock, None)
+                client_compressors.pop(client_sock, None)
             # 2. 清理玩家状态
             with state_lock:
                 player_states.pop(player_id, None)
@@ -688,9 +1119,17 @@ def build_broadcast_msg():
 
 
 def safe_send(sock, msg):
-    """安全发送消息"""
+    """安全发送消息（已协商压缩的连接先经该连接的zlib流压缩；调用方需持有client_lock以保证压缩流顺序）"""
     try:
         data = msg.encode('utf-8')
+        compressor = client_compressors.get(sock)
+        if compressor is not None:
+            compress_start = time.perf_counter()
+            raw_len = len(data)
+            data = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            compression_stats["cpu_time"] += time.perf_counter() - compress_start
+            compression_stats["raw_bytes"] += raw_len
+            compression_stats["compressed_bytes"] += len(data)
         total_sent = 0
         data_len = len(data)
         while total_sent < data_len and game_running:
@@ -721,26 +1160,31 @@ def game_main_loop():
             # 1. 获取在线玩家ID
             with client_lock:
                 online_pids = list(client_id_map.values())
-            # 2. 更新所有玩家状态（移动/转向/开火/受伤）
+            # 2. 开火结算：所有按住开火的玩家基于同一快照批量命中检测（受伤标记在本帧移动更新中生效）
+            resolve_fire_batch()
+            # 3. 更新所有玩家状态（移动/转向/开火/受伤）
             for pid in online_pids:
                 update_player_movement(pid)
                 update_player_rotation(pid)
 
-            # 3. 构建并广播状态消息
+            # 4. 构建并广播状态消息
             broadcast_msg = build_broadcast_msg()
             dead_sockets = []
             with client_lock:
                 for sock in list(client_sockets):
                     if not safe_send(sock, broadcast_msg):
                         dead_sockets.append(sock)
+                compression_stats["ticks"] += 1
+            publish_spectator_feed(broadcast_msg)
 
-            # 4. 清理失效连接
+            # 5. 清理失效连接
             if dead_sockets:
                 with client_lock:
                     for sock in dead_sockets:
                         if sock in client_sockets:
                             client_sockets.remove(sock)
                         client_id_map.pop(sock, None)
+                        client_compressors.pop(sock, None)
                         try:
                             sock.close()
                         except:
@@ -753,6 +1197,65 @@ def game_main_loop():
             time.sleep(0.1)
 
 
+# ===================== 观战广播流（供spectator_relay.py订阅）=====================
+def publish_spectator_feed(msg):
+    """投递一条广播消息到观战流（无中继订阅时直接返回；队列满时丢弃，不阻塞调用方）"""
+    if not spectator_feed_subscribers:
+        return
+    try:
+        spectator_feed_queue.put_nowait(msg)
+    except queue.Full:
+        pass
+
+
+def spectator_feed_accept_loop():
+    """接受观战中继进程的订阅连接（中继只读，不分配玩家ID、不进入client_id_map）"""
+    feed_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    feed_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        feed_sock.bind((SPECTATOR_FEED_HOST, SPECTATOR_FEED_PORT))
+        feed_sock.listen(4)
+        log(f"观战广播流启动 → 监听 {SPECTATOR_FEED_HOST}:{SPECTATOR_FEED_PORT}")
+    except Exception as e:
+        log_error(f"观战广播流启动失败：{str(e)}")
+        feed_sock.close()
+        return
+
+    while game_running:
+        try:
+            relay_sock, relay_addr = feed_sock.accept()
+            relay_sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            relay_sock.settimeout(1.0)  # 中继卡死时发送超时即断开，不拖住发送线程
+            with spectator_feed_lock:
+                spectator_feed_subscribers.append(relay_sock)
+            log(f"观战中继[{relay_addr[0]}:{relay_addr[1]}]已订阅广播流")
+        except Exception as e:
+            log_error(f"接受观战中继连接异常：{str(e)}")
+            time.sleep(0.1)
+    feed_sock.close()
+
+
+def spectator_feed_send_loop():
+    """观战广播流发送线程：每条消息以换行分帧，写给所有中继（发送失败的中继直接移除）"""
+    while game_running:
+        try:
+            msg = spectator_feed_queue.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        data = (msg + "\n").encode("utf-8")
+        with spectator_feed_lock:
+            for relay_sock in list(spectator_feed_subscribers):
+                try:
+                    relay_sock.sendall(data)
+                except Exception as e:
+                    log_error(f"观战中继发送失败：{str(e)}，取消订阅")
+                    spectator_feed_subscribers.remove(relay_sock)
+                    try:
+                        relay_sock.close()
+                    except:
+                        pass
+
+
 # ===================== 死连接检测（无修改）=====================
 def check_dead_connections():
     """检测并清理客户端死连接"""
@@ -777,6 +1280,7 @@ def check_dead_connections():
                     if sock in client_sockets:
                         client_sockets.remove(sock)
                     client_id_map.pop(sock, None)
+                    client_compressors.pop(sock, None)
                     try:
                         sock.close()
                     except:
@@ -785,9 +1289,14 @@ def check_dead_connections():
 
 
 # ===================== 服务器启动（无核心修改）=====================
+def handle_shutdown_signal(signum, frame):
+    """SIGTERM（如浸泡测试terminate()）与Ctrl+C走同一关闭流程"""
+    raise KeyboardInterrupt
+
+
 def start_server():
     """启动服务器，监听8888端口"""
-    global game_running
+    global game_running, arena_grid
     server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_SIZE)
@@ -803,13 +1312,21 @@ def start_server():
         log_error(f"服务器启动失败：{str(e)}")
         sys.exit(1)
 
-    # 启动子线程（新增得分协议广播线程）
+    # 加载竞技场碰撞栅格（仅启动时加载一次）
+    arena_grid = load_arena_grid(ARENA_GRID_PATH)
+
+    # 启动子线程（新增得分协议广播线程、战绩写入线程）
+    start_stats_writer()
     threading.Thread(target=game_main_loop, daemon=True, name="GameMainLoop").start()
     threading.Thread(target=check_dead_connections, daemon=True, name="DeadConnCheck").start()
     threading.Thread(target=print_command_and_state_stats, daemon=True, name="StatsPrint").start()
     threading.Thread(target=send_score_protocol_loop, daemon=True, name="ScoreBroadcastLoop").start()
+    if SPECTATOR_FEED_ENABLED:
+        threading.Thread(target=spectator_feed_accept_loop, daemon=True, name="SpectatorFeedAccept").start()
+        threading.Thread(target=spectator_feed_send_loop, daemon=True, name="SpectatorFeedSend").start()
 
-    # 接收客户端连接
+    # 接收客户端连接（SIGTERM与Ctrl+C一样进入下方关闭流程）
+    signal.signal(signal.SIGTERM, handle_shutdown_signal)
     try:
         log(f"⏳ 等待客户端连接...")
         while game_running:
@@ -822,9 +1339,12 @@ def start_server():
             ).start()
     except KeyboardInterrupt:
         log("⚠️ 收到关闭信号，正在停止服务器...")
-        game_running = False
     finally:
         server_sock.close()
+        # 先补记在线玩家的时长，再停止游戏循环，写入线程取空队列后提交并写入结束时间
+        record_open_sessions()
+        game_running = False
+        stop_stats_writer()
         log("🔌 服务器已完全关闭")
 
 
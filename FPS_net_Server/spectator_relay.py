@@ -0,0 +1,253 @@
+"""
+观战中继进程：向游戏服务器订阅一次广播流（pos| / s| / d|），再扇出给任意数量的只读观众
+
+观众不连接游戏服务器：不占用client_id_map、不参与每帧广播、不生成玩家。
+用法：
+    python spectator_relay.py                       # 订阅127.0.0.1:8889，观众连接8890
+    python spectator_relay.py --delay 30            # 观战延迟30秒（防止直播透视）
+    python spectator_relay.py --feed 127.0.0.1:8889 --port 8890 --max-viewers 2000
+"""
+import argparse
+import collections
+import selectors
+import socket
+import sys
+import time
+from datetime import datetime
+
+# ===================== 全局配置 =====================
+FEED_HOST = "127.0.0.1"  # 游戏服务器观战广播流地址（server142.py的SPECTATOR_FEED_HOST/PORT）
+FEED_PORT = 8889
+LISTEN_HOST = "0.0.0.0"  # 观众连接地址
+LISTEN_PORT = 8890
+SPECTATOR_DELAY = 0.0  # 观战延迟（秒）
+MAX_VIEWERS = 1000  # 观众上限
+VIEWER_MAX_PENDING = 64 * 1024  # 单个观众发送积压上限（字节），超出即断开，慢观众不拖累其他人
+FEED_RECONNECT_INTERVAL = 2.0  # 广播流断开后的重连间隔（秒）
+STATS_PRINT_INTERVAL = 5.0  # 中继状态打印间隔（秒）
+RECV_BUFFER_SIZE = 65536
+
+
+# ===================== 工具函数 =====================
+def log(msg):
+    """普通日志"""
+    now = datetime.now().strftime("[%H:%M:%S]")
+    print(f"{now} 📢 {msg}")
+
+
+def log_error(msg):
+    """错误日志"""
+    now = datetime.now().strftime("[%H:%M:%S]")
+    print(f"{now} ❌ {msg}")
+
+
+def connect_feed(feed_host, feed_port):
+    """连接游戏服务器观战广播流，失败返回None"""
+    try:
+        feed_sock = socket.create_connection((feed_host, feed_port), timeout=3.0)
+        feed_sock.setblocking(False)
+        log(f"已订阅游戏服务器广播流 {feed_host}:{feed_port}")
+        return feed_sock
+    except OSError as e:
+        log_error(f"订阅广播流{feed_host}:{feed_port}失败：{str(e)}，{FEED_RECONNECT_INTERVAL}秒后重试")
+        return None
+
+
+# ===================== 中继主循环 =====================
+def run_relay(feed_host, feed_port, listen_host, listen_port, delay, max_viewers):
+    """单线程selector事件循环：读取广播流 → 按延迟排队 → 扇出给所有观众"""
+    selector = selectors.DefaultSelector()
+
+    listen_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listen_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listen_sock.bind((listen_host, listen_port))
+    listen_sock.listen(128)
+    listen_sock.setblocking(False)
+    selector.register(listen_sock, selectors.EVENT_READ, "listen")
+    log(f"🚀 观战中继启动 → 观众端口 {listen_host}:{listen_port}，观战延迟{delay}秒，观众上限{max_viewers}")
+
+    viewers = {}  # socket → 待发送积压（bytearray）
+    delayed_msgs = collections.deque()  # (可发送时间, 消息字节)
+    feed_sock = None
+    feed_buffer = bytearray()
+    next_feed_connect_time = 0.0
+    relayed_msgs = 0
+    dropped_viewers = 0
+    last_stats_time = time.time()
+
+    def drop_viewer(sock, reason):
+        nonlocal dropped_viewers
+        viewers.pop(sock, None)
+        try:
+            selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+        try:
+            sock.close()
+        except OSError:
+            pass
+        dropped_viewers += 1
+        log(f"观众断开（{reason}），当前观众：{len(viewers)}")
+
+    def send_to_viewer(sock, data):
+        """有积压则追加到积压，否则直接发送；发不完的部分进入积压并等待可写事件"""
+        pending = viewers[sock]
+        if pending:
+            pending += data
+        else:
+            try:
+                sent = sock.send(data)
+            except BlockingIOError:
+                sent = 0
+            except OSError as e:
+                drop_viewer(sock, f"发送失败：{str(e)}")
+                return
+            if sent < len(data):
+                pending += data[sent:]
+                selector.modify(sock, selectors.EVENT_READ | selectors.EVENT_WRITE, "viewer")
+        if len(pending) > VIEWER_MAX_PENDING:
+            drop_viewer(sock, f"积压超过{VIEWER_MAX_PENDING}字节")
+
+    try:
+        while True:
+            now = time.time()
+
+            # 1. 广播流断开时定期重连
+            if feed_sock is None and now >= next_feed_connect_time:
+                feed_sock = connect_feed(feed_host, feed_port)
+                if feed_sock is not None:
+                    feed_buffer.clear()
+                    selector.register(feed_sock, selectors.EVENT_READ, "feed")
+                else:
+                    next_feed_connect_time = now + FEED_RECONNECT_INTERVAL
+
+            # 2. 扇出已到期的消息
+            while delayed_msgs and delayed_msgs[0][0] <= now:
+                _, data = delayed_msgs.popleft()
+                for sock in list(viewers):
+                    send_to_viewer(sock, data)
+                relayed_msgs += 1
+
+            # 3. 等待事件（最多等到下一条延迟消息到期）
+            timeout = 0.5
+            if delayed_msgs:
+                timeout = max(0.0, min(timeout, delayed_msgs[0][0] - now))
+            for key, events in selector.select(timeout):
+                sock = key.fileobj
+                if key.data == "listen":
+                    try:
+                        viewer_sock, viewer_addr = listen_sock.accept()
+                    except BlockingIOError:
+                        continue
+                    if len(viewers) >= max_viewers:
+                        viewer_sock.close()
+                        log_error(f"观众数已达上限{max_viewers}，拒绝[{viewer_addr[0]}:{viewer_addr[1]}]")
+                        continue
+                    viewer_sock.setblocking(False)
+                    viewer_sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    viewers[viewer_sock] = bytearray()
+                    selector.register(viewer_sock, selectors.EVENT_READ, "viewer")
+                    log(f"观众[{viewer_addr[0]}:{viewer_addr[1]}]加入，当前观众：{len(viewers)}")
+
+                elif key.data == "feed":
+                    try:
+                        data = sock.recv(RECV_BUFFER_SIZE)
+                    except BlockingIOError:
+                        continue
+                    except OSError as e:
+                        data = b""
+                        log_error(f"广播流读取异常：{str(e)}")
+                    if not data:
+                        log_error("游戏服务器广播流断开，等待重连")
+                        selector.unregister(sock)
+                        sock.close()
+                        feed_sock = None
+                        next_feed_connect_time = time.time() + FEED_RECONNECT_INTERVAL
+                        continue
+                    # 广播流以换行分帧，转发给观众时去掉换行（与游戏客户端收到的格式一致）
+                    feed_buffer += data
+                    recv_time = time.time()
+                    while True:
+                        newline = feed_buffer.find(b"\n")
+                        if newline < 0:
+                            break
+                        delayed_msgs.append((recv_time + delay, bytes(feed_buffer[:newline])))
+                        del feed_buffer[:newline + 1]
+
+                else:  # 观众连接
+                    if sock not in viewers:  # 本轮已被断开
+                        continue
+                    if events & selectors.EVENT_READ:
+                        # 观众只读：丢弃其发来的数据，仅用于检测断开
+                        try:
+                            if not sock.recv(1024):
+                                drop_viewer(sock, "主动断开")
+                                continue
+                        except BlockingIOError:
+                            pass
+                        except OSError as e:
+                            drop_viewer(sock, f"读取异常：{str(e)}")
+                            continue
+                    if events & selectors.EVENT_WRITE and sock in viewers:
+                        pending = viewers[sock]
+                        try:
+                            sent = sock.send(pending)
+                            del pending[:sent]
+                        except BlockingIOError:
+                            pass
+                        except OSError as e:
+                            drop_viewer(sock, f"发送失败：{str(e)}")
+                            continue
+                        if not pending:
+                            selector.modify(sock, selectors.EVENT_READ, "viewer")
+
+            # 4. 定期打印中继状态
+            if time.time() - last_stats_time >= STATS_PRINT_INTERVAL:
+                backlog = sum(len(p) for p in viewers.values())
+                log(f"📊 中继状态 → 观众{len(viewers)}个 | 广播流{'已连接' if feed_sock else '未连接'}"
+                    f" | 转发{relayed_msgs}条 | 延迟队列{len(delayed_msgs)}条 | 观众积压{backlog}字节 | 累计断开{dropped_viewers}个")
+                relayed_msgs = 0
+                last_stats_time = time.time()
+    except KeyboardInterrupt:
+        log("⚠️ 收到关闭信号，正在停止观战中继...")
+    finally:
+        for sock in list(viewers):
+            try:
+                sock.close()
+            except OSError:
+                pass
+        if feed_sock is not None:
+            feed_sock.close()
+        listen_sock.close()
+        selector.close()
+        log("🔌 观战中继已关闭")
+
+
+def parse_host_port(value, default_port):
+    """解析 host:port"""
+    host, _, port = value.rpartition(":")
+    if not host:
+        return value, default_port
+    return host, int(port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="FPS_net观战中继：订阅一次广播流，扇出给只读观众")
+    parser.add_argument("--feed", default=f"{FEED_HOST}:{FEED_PORT}", help="游戏服务器观战广播流地址 host:port")
+    parser.add_argument("--host", default=LISTEN_HOST, help="观众连接监听地址")
+    parser.add_argument("--port", type=int, default=LISTEN_PORT, help="观众连接监听端口")
+    parser.add_argument("--delay", type=float, default=SPECTATOR_DELAY, help="观战延迟（秒）")
+    parser.add_argument("--max-viewers", type=int, default=MAX_VIEWERS, help="观众上限")
+    args = parser.parse_args(argv)
+
+    feed_host, feed_port = parse_host_port(args.feed, FEED_PORT)
+    run_relay(feed_host, feed_port, args.host, args.port, max(0.0, args.delay), args.max_viewers)
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except Exception as e:
+        log_error(f"观战中继启动失败：{str(e)}")
+        sys.exit(1)